@@ -1,1048 +1,1320 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-POAtools - Step 4: Gene Classification Visualization (Python Version)
-Complete Python implementation that exactly replicates R script functionality
-"""
-
-import os
-import sys
-import argparse
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.backends.backend_pdf import PdfPages
-import re
-import warnings
-warnings.filterwarnings('ignore')
-
-class ExactRReplication:
-    def __init__(self, high_threshold=0.8, medium_threshold=0.5, min_threshold=0.4, visual=True):
-        self.high_threshold = high_threshold
-        self.medium_threshold = medium_threshold
-        self.min_threshold = min_threshold
-        self.visual = visual
-        self.chromosome_lengths = {}
-        
-    def read_gff_data(self, gff_file):
-        """Exactly replicate R's GFF reading functionality"""
-        print(f"Reading GFF file: {gff_file}")
-        
-        gff_data = []
-        
-        # Read chromosome lengths from header (replicating R's behavior)
-        with open(gff_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.startswith('##sequence-region'):
-                    parts = line.strip().split()
-                    if len(parts) >= 4:
-                        chrom = parts[1]
-                        length = int(parts[3])
-                        self.chromosome_lengths[chrom] = length
-                
-                if line.startswith('#'):
-                    continue
-                
-                parts = line.strip().split('\t')
-                if len(parts) < 9:
-                    continue
-                
-                # Only process gene features (exactly like R)
-                if parts[2] != 'gene':
-                    continue
-                
-                seqname = parts[0]
-                feature_type = parts[2]
-                start = int(parts[3])
-                end = int(parts[4])
-                strand = parts[6]
-                attributes = parts[8]
-                
-                # Parse attributes exactly like R
-                gene_id = None
-                for attr in attributes.split(';'):
-                    if 'ID=' in attr:
-                        gene_id = attr.split('=')[1]
-                        break
-                    elif 'gene_id=' in attr:
-                        gene_id = attr.split('=')[1]
-                        break
-                    elif 'Name=' in attr:
-                        gene_id = attr.split('=')[1]
-                        break
-                
-                if gene_id:
-                    gff_data.append({
-                        'Gene': gene_id,
-                        'Chromosome': seqname,
-                        'Start': start,
-                        'End': end,
-                        'Length': end - start + 1,
-                        'Strand': strand
-                    })
-        
-        gff_df = pd.DataFrame(gff_data)
-        print(f"  Found {len(gff_df)} genes in GFF file")
-        print(f"  Found {len(self.chromosome_lengths)} chromosome lengths")
-        
-        return gff_df
-    
-    def check_and_resolve_overlaps(self, data):
-        """Exactly replicate R's overlap resolution logic"""
-        
-        resolved_data = data.copy()
-        
-        for chrom in resolved_data['Chromosome'].unique():
-            chr_data = resolved_data[resolved_data['Chromosome'] == chrom].sort_values('Start')
-            
-            if len(chr_data) < 2:
-                continue
-            
-            i = 0
-            while i < len(chr_data) - 1:
-                row_i = chr_data.iloc[i]
-                row_i1 = chr_data.iloc[i+1]
-                
-                if row_i['End'] >= row_i1['Start']:
-                    
-                    if row_i['Primary_Class'] == row_i1['Primary_Class']:
-                        # Merge overlapping genes with same classification
-                        new_end = max(row_i['End'], row_i1['End'])
-                        resolved_data.loc[resolved_data['Gene'] == row_i['Gene'], 'End'] = new_end
-                        
-                        # Remove the second gene
-                        resolved_data = resolved_data[resolved_data['Gene'] != row_i1['Gene']]
-                        
-                        # Refresh chromosome data
-                        chr_data = resolved_data[resolved_data['Chromosome'] == chrom].sort_values('Start')
-                    else:
-                        # Adjust end position for different classifications
-                        resolved_data.loc[resolved_data['Gene'] == row_i['Gene'], 'End'] = row_i1['Start'] - 1
-                        i += 1
-                else:
-                    i += 1
-        
-        return resolved_data
-    
-    def create_gene_intervals(self, data):
-        """Exactly replicate R's gene interval creation logic"""
-        intervals_list = []
-        
-        for chrom in data['Chromosome'].unique():
-            chr_data = data[data['Chromosome'] == chrom].sort_values('Start')
-            
-            if len(chr_data) == 0:
-                continue
-            
-            # Create initial intervals (gene regions only)
-            gene_intervals = pd.DataFrame({
-                'Chromosome': chrom,
-                'Start': chr_data['Start'].values,
-                'End': chr_data['End'].values,
-                'Primary_Class': chr_data['Primary_Class'].astype(str).values
-            })
-            
-            # Merge overlapping and adjacent same-class segments
-            merged_intervals = pd.DataFrame(columns=['Chromosome', 'Start', 'End', 'Primary_Class'])
-            
-            if len(gene_intervals) > 0:
-                gene_intervals = gene_intervals.sort_values('Start')
-                
-                current_start = gene_intervals['Start'].iloc[0]
-                current_end = gene_intervals['End'].iloc[0]
-                current_class = gene_intervals['Primary_Class'].iloc[0]
-                
-                for i in range(1, len(gene_intervals)):
-                    row = gene_intervals.iloc[i]
-                    if (row['Primary_Class'] == current_class and 
-                        row['Start'] <= current_end + 1):
-                        current_end = max(current_end, row['End'])
-                    else:
-                        merged_intervals = pd.concat([merged_intervals, pd.DataFrame({
-                            'Chromosome': [chrom],
-                            'Start': [current_start],
-                            'End': [current_end],
-                            'Primary_Class': [current_class]
-                        })], ignore_index=True)
-                        current_start = row['Start']
-                        current_end = row['End']
-                        current_class = row['Primary_Class']
-                
-                merged_intervals = pd.concat([merged_intervals, pd.DataFrame({
-                    'Chromosome': [chrom],
-                    'Start': [current_start],
-                    'End': [current_end],
-                    'Primary_Class': [current_class]
-                })], ignore_index=True)
-            
-            # Add intergenic regions
-            final_intervals = pd.DataFrame(columns=['Chromosome', 'Start', 'End', 'Primary_Class'])
-            
-            # Add region before first gene
-            if len(merged_intervals) > 0 and merged_intervals['Start'].iloc[0] > 1:
-                final_intervals = pd.concat([final_intervals, pd.DataFrame({
-                    'Chromosome': [chrom],
-                    'Start': [1],
-                    'End': [merged_intervals['Start'].iloc[0] - 1],
-                    'Primary_Class': ['Intergenic']
-                })], ignore_index=True)
-            
-            # Add merged gene regions and intergenic regions
-            for i in range(len(merged_intervals)):
-                # Add current gene region
-                final_intervals = pd.concat([final_intervals, pd.DataFrame({
-                    'Chromosome': [chrom],
-                    'Start': [merged_intervals['Start'].iloc[i]],
-                    'End': [merged_intervals['End'].iloc[i]],
-                    'Primary_Class': [merged_intervals['Primary_Class'].iloc[i]]
-                })], ignore_index=True)
-                
-                # Add intergenic region if exists
-                if i < len(merged_intervals) - 1:
-                    gap_start = merged_intervals['End'].iloc[i] + 1
-                    gap_end = merged_intervals['Start'].iloc[i+1] - 1
-                    
-                    if gap_start <= gap_end:
-                        final_intervals = pd.concat([final_intervals, pd.DataFrame({
-                            'Chromosome': [chrom],
-                            'Start': [gap_start],
-                            'End': [gap_end],
-                            'Primary_Class': [merged_intervals['Primary_Class'].iloc[i]]
-                        })], ignore_index=True)
-            
-            # Add region after last gene
-            if chrom in self.chromosome_lengths and len(merged_intervals) > 0:
-                chr_length = self.chromosome_lengths[chrom]
-                last_gene_end = merged_intervals['End'].iloc[-1]
-                if last_gene_end < chr_length:
-                    final_intervals = pd.concat([final_intervals, pd.DataFrame({
-                        'Chromosome': [chrom],
-                        'Start': [last_gene_end + 1],
-                        'End': [chr_length],
-                        'Primary_Class': ['Intergenic']
-                    })], ignore_index=True)
-            
-            # Final merge of all adjacent same-class segments
-            if len(final_intervals) > 0:
-                fully_merged = pd.DataFrame(columns=['Chromosome', 'Start', 'End', 'Primary_Class'])
-                
-                current_final_start = final_intervals['Start'].iloc[0]
-                current_final_end = final_intervals['End'].iloc[0]
-                current_final_class = final_intervals['Primary_Class'].iloc[0]
-                
-                for j in range(1, len(final_intervals)):
-                    row = final_intervals.iloc[j]
-                    if (row['Primary_Class'] == current_final_class and 
-                        row['Start'] == current_final_end + 1):
-                        current_final_end = row['End']
-                    else:
-                        fully_merged = pd.concat([fully_merged, pd.DataFrame({
-                            'Chromosome': [chrom],
-                            'Start': [current_final_start],
-                            'End': [current_final_end],
-                            'Primary_Class': [current_final_class]
-                        })], ignore_index=True)
-                        current_final_start = row['Start']
-                        current_final_end = row['End']
-                        current_final_class = row['Primary_Class']
-                
-                fully_merged = pd.concat([fully_merged, pd.DataFrame({
-                    'Chromosome': [chrom],
-                    'Start': [current_final_start],
-                    'End': [current_final_end],
-                    'Primary_Class': [current_final_class]
-                })], ignore_index=True)
-                
-                intervals_list.append(fully_merged)
-        
-        # Combine intervals from all chromosomes
-        if intervals_list:
-            all_intervals = pd.concat(intervals_list, ignore_index=True)
-            all_intervals['Center'] = (all_intervals['Start'] + all_intervals['End']) / 2
-            all_intervals['Length'] = all_intervals['End'] - all_intervals['Start'] + 1
-            return all_intervals
-        else:
-            return pd.DataFrame(columns=['Chromosome', 'Start', 'End', 'Primary_Class', 'Center', 'Length'])
-    
-    def process_data(self, stats_file, gff_file):
-        """Exactly replicate R's data processing logic"""
-        print("Processing data...")
-        
-        # Read gene stats data (exactly like R)
-        if stats_file.endswith('.txt'):
-            data = pd.read_csv(stats_file, sep='\t')
-        else:
-            data = pd.read_csv(stats_file)
-        
-        print(f"  Loaded {len(data)} genes from stats file")
-        
-        # Read GFF data
-        gff_df = self.read_gff_data(gff_file)
-        
-        # Merge with GFF information (left_join equivalent)
-        data_processed = pd.merge(data, gff_df, on='Gene', how='left')
-        
-        # Calculate total score and ratios (exactly like R)
-        data_processed['Total_Score'] = (data_processed['A'] + data_processed['B'] + 
-                                        data_processed['AB'] + data_processed['NAB'] + 
-                                        data_processed['AXB'])
-        
-        # Calculate ratios and handle division by zero (exactly like R)
-        for score_type in ['A', 'B', 'AB', 'NAB', 'AXB']:
-            ratio_col = f'{score_type}_ratio'
-            data_processed[ratio_col] = data_processed[score_type] / data_processed['Total_Score']
-            data_processed[ratio_col] = data_processed[ratio_col].fillna(0)
-        
-        # Sort by chromosome and start position (exactly like R)
-        data_processed = data_processed.sort_values(['Chromosome', 'Start'])
-        
-        # Check for unmatched genes (exactly like R)
-        unmatched_genes = data_processed[data_processed['Start'].isna()]['Gene']
-        if len(unmatched_genes) > 0:
-            print(f"Warning: {len(unmatched_genes)} genes could not be matched in GFF file")
-            print("These genes will be excluded from physical position-based analysis")
-        
-        return data_processed
-    
-    def classify_genes(self, data):
-        """Exactly replicate R's gene classification logic"""
-        print("Classifying genes...")
-        
-        # Find maximum ratio for each gene (exactly like R)
-        ratio_cols = ['A_ratio', 'B_ratio', 'AB_ratio', 'NAB_ratio', 'AXB_ratio']
-        data['Max_Ratio'] = data[ratio_cols].max(axis=1)
-        
-        # Determine primary classification (exactly like R's case_when logic)
-        def get_primary_class(row):
-            max_ratio = row['Max_Ratio']
-            
-            # If max ratio < min_threshold, classify as NAB (Mixed in R is mapped to NAB)
-            if max_ratio < self.min_threshold:
-                return 'NAB'
-            
-            # Find the class with maximum ratio
-            ratios = {
-                'A': row['A_ratio'],
-                'B': row['B_ratio'],
-                'AB': row['AB_ratio'],
-                'NAB': row['NAB_ratio'],
-                'AXB': row['AXB_ratio']
-            }
-            
-            return max(ratios.items(), key=lambda x: x[1])[0]
-        
-        data['Primary_Class'] = data.apply(get_primary_class, axis=1)
-        
-        # Determine confidence level (exactly like R's case_when logic)
-        def get_confidence(row):
-            max_ratio = row['Max_Ratio']
-            if max_ratio > self.high_threshold:
-                return 'High'
-            elif max_ratio > self.medium_threshold:
-                return 'Medium'
-            else:
-                return 'Low'
-        
-        data['Confidence'] = data.apply(get_confidence, axis=1)
-        data['Composite_Class'] = data['Primary_Class'] + '_' + data['Confidence']
-        
-        # Calculate center position (exactly like R)
-        data['Center'] = data.apply(
-            lambda row: (row['Start'] + row['End']) / 2 if pd.notna(row['Start']) else np.nan, 
-            axis=1
-        )
-        
-        # Set chromosome order as factor (like in R)
-        def chrom_sort_key(x):
-            numbers = re.findall(r'\d+', x)
-            letters = re.findall(r'[ABD]', x)
-            num = int(numbers[0]) if numbers else float('inf')
-            letter = letters[0] if letters else ''
-            return (num, letter)
-        
-        chrom_order = sorted(data['Chromosome'].dropna().unique(), key=chrom_sort_key)
-        data['Chromosome'] = pd.Categorical(data['Chromosome'], categories=chrom_order, ordered=True)
-        
-        return data
-    
-    def create_chromosome_facet_plot(self, data, confidence_description):
-        """Exactly replicate R's chromosome facet plot"""
-        class_counts = data.groupby(['Chromosome', 'Primary_Class']).size().reset_index(name='Count')
-        
-        # Get unique chromosomes
-        chromosomes = sorted(data['Chromosome'].dropna().unique())
-        
-        # Set up color palette 
-        colors = {
-            'A': '#66c2a5', 
-            'B': '#e78ac3', 
-            'AB': '#fc8d62', 
-            'NAB': '#a6d854', 
-            'AXB': '#8da0cb'
-        }
-        
-        classes = sorted(data['Primary_Class'].unique())
-        
-        color_dict = {}
-        for cls in classes:
-            if cls in colors:
-                color_dict[cls] = colors[cls]
-            else:
-                color_dict[cls] = '#999999'
-        
-        # Create figure with subplots for each chromosome
-        n_chromosomes = len(chromosomes)
-        n_cols = min(4, n_chromosomes)
-        n_rows = (n_chromosomes + n_cols - 1) // n_cols
-        
-        fig, axes = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 3*n_rows))
-        if n_rows == 1 and n_cols == 1:
-            axes = np.array([axes])
-        axes = axes.flatten()
-        
-        for idx, chrom in enumerate(chromosomes):
-            if idx < len(axes):
-                ax = axes[idx]
-                chrom_data = class_counts[class_counts['Chromosome'] == chrom]
-                
-                # Create bars for each class
-                bar_positions = np.arange(len(classes))
-                for i, cls in enumerate(classes):
-                    count = chrom_data[chrom_data['Primary_Class'] == cls]['Count'].values
-                    height = count[0] if len(count) > 0 else 0
-                    ax.bar(bar_positions[i], height, color=color_dict[cls], label=cls if idx == 0 else "")
-                
-                ax.set_xlabel(f'{chrom}')
-                if idx % n_cols == 0:
-                    ax.set_ylabel('Gene Count')
-                ax.set_xticks(bar_positions)
-                ax.set_xticklabels(classes, rotation=45)
-                ax.grid(axis='y', alpha=0.3)
-        
-        # Hide empty subplots
-        for idx in range(len(chromosomes), len(axes)):
-            axes[idx].set_visible(False)
-        
-        plt.suptitle(f'Gene Classification Distribution by Chromosome ({confidence_description})', 
-                    fontsize=16, y=0.98)
-        plt.tight_layout(rect=[0, 0, 0.9, 0.95])
-        
-        return fig
-    
-    def create_physical_heatmap(self, data, confidence_description):
-        """Exactly replicate R's physical heatmap"""
-        # Filter valid data
-        valid_data = data[data['Start'].notna()].copy()
-        
-        if valid_data.empty:
-            fig, ax = plt.subplots(figsize=(12, 8))
-            ax.text(0.5, 0.5, 'No valid physical position data', 
-                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
-            ax.set_title(f'Gene Classification by Physical Position ({confidence_description})')
-            return fig
-        
-        # Set up colors (exact Set2 colors from R)
-        colors = {
-            'A': '#66c2a5', 
-            'B': '#e78ac3', 
-            'AB': '#fc8d62', 
-            'NAB': '#a6d854', 
-            'AXB': '#8da0cb'
-        }
-        
-        # Create figure
-        chromosomes = sorted(valid_data['Chromosome'].unique())
-        n_chromosomes = len(chromosomes)
-        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
-        if n_chromosomes == 1:
-            axes = [axes]
-        
-        for idx, chrom in enumerate(chromosomes):
-            ax = axes[idx]
-            chrom_data = valid_data[valid_data['Chromosome'] == chrom]
-            
-            y_pos = 0
-            for _, gene in chrom_data.iterrows():
-                color = colors.get(gene['Primary_Class'], '#999999')
-                width = (gene['End'] - gene['Start']) / 1e6  # Convert to Mb
-                start_mb = gene['Start'] / 1e6
-                
-                # Create rectangle for gene (exactly like R's geom_tile)
-                rect = plt.Rectangle((start_mb, y_pos), width, 1, 
-                                   facecolor=color, alpha=0.7, edgecolor='none')
-                ax.add_patch(rect)
-            
-            ax.set_ylabel(f'Chr{chrom}')
-            ax.set_xlim(0, valid_data['End'].max() / 1e6)
-            ax.set_ylim(0, 1)
-            ax.set_yticks([0.4])
-            ax.set_yticklabels([f'Chr{chrom}'])
-            ax.grid(axis='x', alpha=0.3)
-            
-            if idx == n_chromosomes - 1:
-                ax.set_xlabel('Physical Position (Mb)')
-        
-        plt.suptitle(f'Gene Classification by Physical Position ({confidence_description})', 
-                    fontsize=16, y=0.95)
-        plt.tight_layout(rect=[0, 0, 0.95, 0.95])
-        
-        # Add legend
-        from matplotlib.patches import Patch
-        legend_elements = [Patch(facecolor=color, label=cls) 
-                         for cls, color in colors.items()]
-        fig.legend(handles=legend_elements, loc='upper right', 
-                  bbox_to_anchor=(0.98, 0.98))
-        
-        return fig
-    
-    def create_adjacent_gene_plot(self, data, confidence_description):
-        """Exactly replicate R's adjacent gene region plot"""
-        intervals_data = self.create_gene_intervals(data)
-        
-        if intervals_data.empty:
-            fig, ax = plt.subplots(figsize=(12, 8))
-            ax.text(0.5, 0.5, 'No adjacent gene region data', 
-                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
-            ax.set_title(f'Adjacent Gene Region Classification ({confidence_description})')
-            return fig
-        
-        # Filter out intergenic regions (exactly like R)
-        gene_intervals = intervals_data[intervals_data['Primary_Class'] != 'Intergenic']
-        
-        if gene_intervals.empty:
-            fig, ax = plt.subplots(figsize=(12, 8))
-            ax.text(0.5, 0.5, 'No gene region data', 
-                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
-            ax.set_title(f'Adjacent Gene Region Classification ({confidence_description})')
-            return fig
-        
-        # Set up colors (exact Set2 colors from R)
-        colors = {
-            'A': '#66c2a5', 
-            'B': '#e78ac3', 
-            'AB': '#fc8d62', 
-            'NAB': '#a6d854', 
-            'AXB': '#8da0cb'
-        }
-        
-        # Create figure
-        chromosomes = sorted(gene_intervals['Chromosome'].unique())
-        n_chromosomes = len(chromosomes)
-        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
-        if n_chromosomes == 1:
-            axes = [axes]
-        
-        for idx, chrom in enumerate(chromosomes):
-            ax = axes[idx]
-            chrom_data = gene_intervals[gene_intervals['Chromosome'] == chrom]
-            
-            y_pos = 0
-            for _, interval in chrom_data.iterrows():
-                color = colors.get(interval['Primary_Class'], '#999999')
-                width = (interval['End'] - interval['Start']) / 1e6
-                start_mb = interval['Start'] / 1e6
-                
-                rect = plt.Rectangle((start_mb, y_pos), width, 1,
-                                   facecolor=color, alpha=0.7, edgecolor='none')
-                ax.add_patch(rect)
-            
-            ax.set_ylabel(f'Chr{chrom}')
-            ax.set_xlim(0, gene_intervals['End'].max() / 1e6)
-            ax.set_ylim(0, 1)
-            ax.set_yticks([0.4])
-            ax.set_yticklabels([f'Chr{chrom}'])
-            ax.grid(axis='x', alpha=0.3)
-            
-            if idx == n_chromosomes - 1:
-                ax.set_xlabel('Physical Position (Mb)')
-        
-        plt.suptitle(f'Adjacent Gene Region Classification ({confidence_description})', 
-                    fontsize=16, y=0.95)
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-                
-                # Add legend
-        from matplotlib.patches import Patch
-        legend_elements = [Patch(facecolor=color, label=cls) 
-                         for cls, color in colors.items()]
-        fig.legend(handles=legend_elements, loc='upper right', 
-                  bbox_to_anchor=(0.98, 0.98))
-        
-        return fig
-    
-    def create_score_ratio_plot(self, data, confidence_description):
-        """Exactly replicate R's score ratio line plot"""
-        # Prepare data for plotting (exactly like R's pivot_longer)
-        plot_data = []
-        for _, gene in data.iterrows():
-            if pd.notna(gene['Center']):
-                for score_type in ['A', 'B', 'AB', 'NAB', 'AXB']:
-                    plot_data.append({
-                        'Chromosome': gene['Chromosome'],
-                        'Position_Mb': gene['Center'] / 1e6,
-                        'Score_Type': score_type,
-                        'Ratio': gene[f'{score_type}_ratio']
-                    })
-    
-        if not plot_data:
-            fig, ax = plt.subplots(figsize=(12, 8))
-            ax.text(0.5, 0.5, 'No valid position data for score ratios', 
-                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
-            ax.set_title(f'Gene Classification Score Ratio ({confidence_description})')
-            return fig
-    
-        plot_df = pd.DataFrame(plot_data)
-    
-        # Set up colors and order (exactly matching R)
-        colors = {
-            'A': '#66c2a5', 
-            'B': '#e78ac3', 
-            'AB': '#fc8d62', 
-            'NAB': '#a6d854', 
-            'AXB': '#8da0cb'
-        }
-        score_order = ['A', 'AB', 'AXB', 'B', 'NAB']
-    
-        # Create figure with subplots for each chromosome
-        chromosomes = sorted(plot_df['Chromosome'].unique())
-        n_chromosomes = len(chromosomes)
-    
-        legend_elements = []
-        for score_type in score_order:
-            legend_elements.append(plt.Line2D([0], [0], color=colors[score_type], lw=2, label=score_type))
-    
-        if n_chromosomes == 0:
-            fig, ax = plt.subplots(figsize=(12, 8))
-            ax.text(0.5, 0.5, 'No chromosome data for score ratios', 
-                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
-            ax.set_title(f'Gene Classification Score Ratio ({confidence_description})')
-            return fig
-    
-        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
-    
-        if n_chromosomes == 1:
-            axes = [axes]
-        else:
-            axes = axes.flatten()
-    
-        for idx, chrom in enumerate(chromosomes):
-            ax = axes[idx]
-            chrom_data = plot_df[plot_df['Chromosome'] == chrom].sort_values('Position_Mb')
-        
-            # Plot each score type (exactly like R)
-            for score_type in score_order:
-                score_data = chrom_data[chrom_data['Score_Type'] == score_type]
-                if len(score_data) > 0:
-                    ax.plot(score_data['Position_Mb'], score_data['Ratio'], 
-                           color=colors[score_type], alpha=0.7, linewidth=1)
-        
-            ax.set_title(f'Chromosome {chrom}')
-            ax.set_xlabel('Position (Mb)')
-            ax.set_ylabel('Score Ratio')
-            ax.set_ylim(0, 1)
-            ax.grid(alpha=0.3)
-    
-        fig.legend(handles=legend_elements, 
-                   loc='lower center', 
-                   bbox_to_anchor=(0.5, 0.02),
-                   ncol=5,
-                   fontsize=10)
-    
-        plt.suptitle(f'Gene Classification Score Ratio ({confidence_description})', 
-                fontsize=16, y=0.98)
-    
-        plt.tight_layout(rect=[0, 0.05, 1, 0.98])
-    
-        return fig
-    
-    def create_confidence_comparison(self, data, confidence_description):
-        """Exactly replicate R's confidence comparison (pie charts)"""
-        # Filter data for different confidence levels
-        data_high = data[data['Confidence'] == 'High']
-        data_medium_above = data[data['Confidence'].isin(['High', 'Medium'])]
-        data_all = data
-        
-        colors = {
-            'A': '#66c2a5', 
-            'B': '#e78ac3', 
-            'AB': '#fc8d62', 
-            'NAB': '#a6d854', 
-            'AXB': '#8da0cb'
-        }
-        
-        datasets = [
-            (data_high, f'High Confidence\n(> {self.high_threshold:.0%})'),
-            (data_medium_above, f'Medium Confidence\n(> {self.medium_threshold:.0%})'),
-            (data_all, 'All Confidence Levels')
-        ]
-        
-        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-        
-        for i, (dataset, title) in enumerate(datasets):
-            ax = axes[i]
-            if len(dataset) > 0:
-                class_counts = dataset['Primary_Class'].value_counts()
-                
-                pie_colors = []
-                for cls in class_counts.index:
-                    if cls in colors:
-                        pie_colors.append(colors[cls])
-                    else:
-                        pie_colors.append('#999999')
-                
-                wedges, texts, autotexts = ax.pie(class_counts.values, labels=class_counts.index, 
-                                                autopct='%1.1f%%', colors=pie_colors, startangle=90)
-                ax.set_title(title, fontsize=14, y=-0.15)
-                
-                # Improve text appearance
-                for autotext in autotexts:
-                    autotext.set_color('white')
-                    autotext.set_fontweight('bold')
-            else:
-                ax.text(0.5, 0.5, 'No Data', ha='center', va='center', 
-                       transform=ax.transAxes, fontsize=12)
-                ax.set_title(title, fontsize=14)
-        
-        plt.suptitle(f'Gene Classification by Confidence Level ({confidence_description})', 
-                    fontsize=16, y=0.95)
-        plt.tight_layout()
-        
-        return fig
-    
-    def generate_summary_statistics(self, data, data_with_position, data_high_only,
-                                  data_medium_above, data_all_confidence):
-        """Exactly replicate R's summary statistics format"""
-        summary_lines = []
-        
-        summary_lines.append("GFF-based Gene Classification Statistical Summary:")
-        summary_lines.append("==================================================")
-        summary_lines.append(f"Total number of genes: {len(data)}")
-        summary_lines.append(f"Genes successfully matched with physical positions: {len(data_with_position)}")
-        summary_lines.append(f"Genes without physical position matches: {len(data) - len(data_with_position)}")
-        
-        if len(data_with_position) > 0:
-            chromosomes = sorted(data_with_position['Chromosome'].dropna().unique())
-            summary_lines.append(f"Chromosomes involved: {', '.join(chromosomes)}")
-        
-        summary_lines.append("\nGene counts by confidence level (High confidence threshold > 80%):")
-        summary_lines.append("==============================================================")
-        
-        if len(data_with_position) > 0:
-            confidence_counts = data_with_position['Confidence'].value_counts().sort_index()
-            for conf, count in confidence_counts.items():
-                percentage = (count / len(data_with_position)) * 100
-                summary_lines.append(f"{conf}: {count} ({percentage:.1f}%)")
-        else:
-            summary_lines.append("No valid physical position data")
-        
-        summary_lines.append("\nCumulative confidence statistics (High confidence threshold > 80%):")
-        summary_lines.append("===============================================================")
-        summary_lines.append(f"High confidence gene count (threshold > 80%): {len(data_high_only)}")
-        summary_lines.append(f"Medium and above confidence gene count: {len(data_medium_above)}")
-        summary_lines.append(f"All confidence level gene count: {len(data_all_confidence)}")
-        
-        summary_lines.append("\nStatistics by primary classification (Mixed classification categorized as NAB):")
-        summary_lines.append("==================================================================================")
-        
-        if len(data_with_position) > 0:
-            class_counts = data_with_position['Primary_Class'].value_counts()
-            for cls, count in class_counts.items():
-                percentage = (count / len(data_with_position)) * 100
-                summary_lines.append(f"{cls}: {count} ({percentage:.1f}%)")
-        else:
-            summary_lines.append("No valid physical position data")
-        
-        summary_lines.append("\nChromosome length statistics:")
-        if len(data_with_position) > 0:
-            for chrom in sorted(data_with_position['Chromosome'].dropna().unique()):
-                if chrom in self.chromosome_lengths:
-                    length_mb = self.chromosome_lengths[chrom] / 1e6
-                    gene_count = len(data_with_position[data_with_position['Chromosome'] == chrom])
-                    summary_lines.append(f"Chromosome {chrom}: Length {length_mb:.2f} Mb, Gene count {gene_count}")
-        else:
-            summary_lines.append("No valid physical position data")
-        
-        return '\n'.join(summary_lines)
-    
-    def create_combined_plots(self, data, confidence_level, confidence_description, output_dir):
-        """Create all plots for a specific confidence level and combine them"""
-        print(f"  Creating plots for {confidence_level}")
-    
-        if not self.visual:
-            print(f"  Visualization disabled, skipping plot creation")
-            return True
-    
-        # Create individual plots
-        fig1 = self.create_chromosome_facet_plot(data, confidence_description)
-        fig2 = self.create_physical_heatmap(data, confidence_description)
-        fig3 = self.create_adjacent_gene_plot(data, confidence_description)
-        fig4 = self.create_score_ratio_plot(data, confidence_description)
-    
-        if confidence_level == "All Confidence":
-            fig5 = self.create_confidence_comparison(data, confidence_description)
-            fig5.savefig(os.path.join(output_dir, 'confidence_pie.pdf'), 
-                        bbox_inches='tight', dpi=300)
-            plt.close(fig5)
-    
-        # Save individual plots
-        plot_prefix = confidence_level.lower().replace(' ', '_')
-    
-        fig1.savefig(os.path.join(output_dir, f'chromosome_facet_{plot_prefix}.pdf'), 
-                    bbox_inches='tight', dpi=300)
-        fig2.savefig(os.path.join(output_dir, f'physical_heatmap_{plot_prefix}.pdf'), 
-                bbox_inches='tight', dpi=300)
-        fig3.savefig(os.path.join(output_dir, f'adjacent_gene_{plot_prefix}.pdf'), 
-                    bbox_inches='tight', dpi=300)
-        fig4.savefig(os.path.join(output_dir, f'score_ratio_{plot_prefix}.pdf'), 
-                    bbox_inches='tight', dpi=300)
-    
-        plt.close('all')
-    
-        return True
-    
-    def run_analysis(self, stats_file, gff_file, output_dir, sample_name):
-        """Main analysis function - exactly replicates R script functionality"""
-        print(f"Starting comprehensive gene classification analysis for {sample_name}")
-        print(f"Visualization enabled: {'Yes' if self.visual else 'No'}")
-        
-        # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Process data (exactly like R)
-        data_processed = self.process_data(stats_file, gff_file)
-        
-        # Classify genes (exactly like R)
-        data_classified = self.classify_genes(data_processed)
-        
-        # Filter data with positions (exactly like R)
-        data_with_position = data_classified[data_classified['Start'].notna()].copy()
-        
-        # Check and resolve overlapping genes (exactly like R)
-        data_with_position = self.check_and_resolve_overlaps(data_with_position)
-        
-        # Create confidence level datasets (exactly like R)
-        data_high_only = data_with_position[data_with_position['Confidence'] == 'High']
-        data_medium_above = data_with_position[data_with_position['Confidence'].isin(['High', 'Medium'])]
-        data_all_confidence = data_with_position
-        
-        # Create plots for each confidence level (exactly like R)
-        if self.visual:
-            confidence_levels = [
-                (data_high_only, "High Confidence", "Only high confidence genes (threshold > 80%)"),
-                (data_medium_above, "Medium Confidence", "Contains medium and high confidence genes (threshold > 50%)"),
-                (data_all_confidence, "All Confidence", "Contains all confidence genes (High+Medium+Low)")
-            ]
-            
-            for data, level, description in confidence_levels:
-                if not data.empty:
-                    self.create_combined_plots(data, level, description, output_dir)
-        
-        # Generate summary statistics (exactly like R)
-        summary_text = self.generate_summary_statistics(
-            data_classified, data_with_position, data_high_only,
-            data_medium_above, data_all_confidence
-        )
-        
-        # Save summary to file
-        with open(os.path.join(output_dir, 'analysis_summary.txt'), 'w', encoding='utf-8') as f:
-            f.write(summary_text)
-        
-        # Save detailed data files (exactly like R)
-        data_classified.to_csv(os.path.join(output_dir, 'gff_based_gene_classification.csv'), index=False)
-        data_with_position.to_csv(os.path.join(output_dir, 'gff_based_gene_classification_with_position.csv'), index=False)
-        
-        # Save by confidence level (exactly like R)
-        data_high_only.to_csv(os.path.join(output_dir, 'gff_based_gene_classification_high_only.csv'), index=False)
-        data_medium_above.to_csv(os.path.join(output_dir, 'gff_based_gene_classification_medium_and_above.csv'), index=False)
-        data_all_confidence.to_csv(os.path.join(output_dir, 'gff_based_gene_classification_all_confidence.csv'), index=False)
-        
-        # Save gene intervals data (exactly like R)
-        intervals_high = self.create_gene_intervals(data_high_only)
-        intervals_medium = self.create_gene_intervals(data_medium_above)
-        intervals_all = self.create_gene_intervals(data_all_confidence)
-        
-        intervals_high.to_csv(os.path.join(output_dir, 'gene_intervals_high_confidence.csv'), index=False)
-        intervals_medium.to_csv(os.path.join(output_dir, 'gene_intervals_medium_confidence.csv'), index=False)
-        intervals_all.to_csv(os.path.join(output_dir, 'gene_intervals_all_confidence.csv'), index=False)
-        
-        # Print completion message (exactly like R)
-        print(f"\nAnalysis completed! All results saved to: {output_dir}")
-        if self.visual:
-            print("Visualization charts have been generated and saved as PDF files.")
-        else:
-            print("Visualization was disabled. No plot files were generated.")
-        print("Note: High confidence threshold is set to > 80%, Mixed classification is categorized as NAB.")
-        print("Chromosome-faceted classification distribution charts and gene classification score ratio line charts use unfiltered data (all confidence levels).")
-        print("Adjacent segments with the same classification are now merged into continuous segments, and overlapping gene issues have been resolved.")
-        
-        return True
-
-def main():
-    parser = argparse.ArgumentParser(description='POAtools - Step 4: Exact R Replication Gene Classification Analysis')
-    parser.add_argument('-i', '--input', required=True, help='Input gene stats file or directory (txt or csv)')
-    parser.add_argument('-genome', required=True, help='Reference genome GFF file')
-    parser.add_argument('-O', '--output', default='./r_style_visualization', help='Output directory')
-    parser.add_argument('-High', type=float, default=0.8, help='High confidence threshold (default: 0.8)')
-    parser.add_argument('-Medium', type=float, default=0.5, help='Medium confidence threshold (default: 0.5)')
-    parser.add_argument('-Min', type=float, default=0.4, help='Minimum confidence threshold (default: 0.4)')
-    parser.add_argument('-v', '--visual', default='T', help='Enable/disable visualization (T/F, default: T)')
-    parser.add_argument('-batch', action='store_true', help='Batch process all files in input directory')
-    
-    args = parser.parse_args()
-    
-    # Process visualization parameter
-    visual = True
-    if args.visual.upper() == 'F':
-        visual = False
-    elif args.visual.upper() == 'T':
-        visual = True
-    else:
-        print(f"Error: Invalid value for -v parameter. Use T or F.")
-        sys.exit(1)
-    
-    # Check if input is a directory for batch processing
-    if os.path.isdir(args.input) and args.batch:
-        print(f"Batch processing mode: Processing all gene stats files in {args.input}")
-        
-        # Create main output directory
-        os.makedirs(args.output, exist_ok=True)
-        
-        # Find all gene_stats_*.txt files
-        gene_stats_files = []
-        for root, dirs, files in os.walk(args.input):
-            for file in files:
-                if file.startswith('gene_stats_') and file.endswith('.txt'):
-                    gene_stats_files.append(os.path.join(root, file))
-        
-        if not gene_stats_files:
-            print(f"Error: No gene_stats_*.txt files found in {args.input}")
-            sys.exit(1)
-        
-        print(f"Found {len(gene_stats_files)} sample files to process")
-        
-        # Process each file
-        success_count = 0
-        for stats_file in gene_stats_files:
-            # Extract sample name from filename
-            filename = os.path.basename(stats_file)
-            if filename.startswith('gene_stats_'):
-                sample_name = filename.replace('gene_stats_', '').replace('.txt', '').replace('.csv', '')
-            else:
-                sample_name = os.path.splitext(filename)[0]
-            
-            # Create sample-specific output directory
-            sample_output_dir = os.path.join(args.output, sample_name)
-            os.makedirs(sample_output_dir, exist_ok=True)
-            
-            print(f"\nProcessing sample: {sample_name}")
-            print(f"  Input: {stats_file}")
-            print(f"  Output: {sample_output_dir}")
-            
-            # Initialize analyzer
-            analyzer = ExactRReplication(
-                high_threshold=args.High,
-                medium_threshold=args.Medium,
-                min_threshold=args.Min,
-                visual=visual
-            )
-            
-            try:
-                success = analyzer.run_analysis(stats_file, args.genome, sample_output_dir, sample_name)
-                if success:
-                    success_count += 1
-                    print(f"  ? Completed: {sample_name}")
-                else:
-                    print(f"  ? Failed: {sample_name}")
-            except Exception as e:
-                print(f"  ? Error processing {sample_name}: {e}")
-        
-        # Generate batch summary
-        print(f"\n{'='*60}")
-        print("Batch Processing Summary")
-        print(f"{'='*60}")
-        print(f"Total files found: {len(gene_stats_files)}")
-        print(f"Successfully processed: {success_count}")
-        print(f"Failed: {len(gene_stats_files) - success_count}")
-        print(f"Output directory: {args.output}")
-        print(f"{'='*60}")
-        
-        # Create summary file
-        with open(os.path.join(args.output, 'batch_processing_summary.txt'), 'w') as f:
-            f.write("Batch Processing Summary\n")
-            f.write("="*80 + "\n")
-            f.write(f"Input directory: {args.input}\n")
-            f.write(f"Total files found: {len(gene_stats_files)}\n")
-            f.write(f"Successfully processed: {success_count}\n")
-            f.write(f"Failed: {len(gene_stats_files) - success_count}\n")
-            f.write(f"Genome file: {args.genome}\n")
-            f.write(f"High threshold: {args.High}\n")
-            f.write(f"Medium threshold: {args.Medium}\n")
-            f.write(f"Min threshold: {args.Min}\n")
-            f.write(f"Visualization: {'Enabled' if visual else 'Disabled'}\n\n")
-            
-            f.write("Individual sample outputs:\n")
-            for sample_dir in sorted(os.listdir(args.output)):
-                sample_path = os.path.join(args.output, sample_dir)
-                if os.path.isdir(sample_path):
-                    f.write(f"  - {sample_dir}: {sample_path}\n")
-        
-        return
-    
-    # Single file processing (original logic)
-    # Validate inputs
-    if not os.path.exists(args.input):
-        print(f"Error: Input path does not exist: {args.input}")
-        sys.exit(1)
-    
-    if not os.path.isfile(args.genome):
-        print(f"Error: Genome file does not exist: {args.genome}")
-        sys.exit(1)
-    
-    # Create output directory
-    os.makedirs(args.output, exist_ok=True)
-    
-    print("POAtools - Step 4: Exact R Replication Gene Classification Analysis")
-    print("=" * 60)
-    print(f"Input file: {args.input}")
-    print(f"Genome file: {args.genome}")
-    print(f"High confidence threshold: {args.High}")
-    print(f"Medium confidence threshold: {args.Medium}")
-    print(f"Minimum confidence threshold: {args.Min}")
-    print(f"Visualization: {'Enabled' if visual else 'Disabled'}")
-    print(f"Output directory: {args.output}")
-    print("=" * 60)
-    
-    # Initialize analyzer
-    analyzer = ExactRReplication(
-        high_threshold=args.High,
-        medium_threshold=args.Medium,
-        min_threshold=args.Min,
-        visual=visual
-    )
-    
-    # Extract sample name from filename
-    filename = os.path.basename(args.input)
-    if filename.startswith('gene_stats_'):
-        sample_name = filename.replace('gene_stats_', '').replace('.txt', '').replace('.csv', '')
-    else:
-        sample_name = os.path.splitext(filename)[0]
-    
-    # Run analysis
-    try:
-        success = analyzer.run_analysis(args.input, args.genome, args.output, sample_name)
-        if success:
-            print("=" * 60)
-            print("Step 4 completed successfully!")
-            print(f"Results saved to: {args.output}")
-        else:
-            print("Step 4 failed!")
-            sys.exit(1)
-    except Exception as e:
-        print(f"Error during analysis: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
-
-if __name__ == '__main__':
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+POAtools - Step 4: Gene Classification Visualization (Python Version)
+Complete Python implementation that exactly replicates R script functionality
+"""
+
+import os
+import sys
+import glob
+import argparse
+import concurrent.futures
+
+# Headless backend: required before pyplot so pool workers can render
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib.backends.backend_pdf import PdfPages
+import re
+import functools
+import warnings
+warnings.filterwarnings('ignore')
+
+# Embed TrueType fonts once per document instead of re-subsetting Type 3
+plt.rcParams['pdf.fonttype'] = 42
+
+# Optional fast path for GFF parsing
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# Optional fast path for CSV output
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+# Optional JIT for the interval merge kernel
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def _decorate(func):
+            return func
+        return _decorate
+
+
+# Fast-path kwargs for the pandas CSV fallback: a fixed line terminator
+# and chunked writes keep pandas on its C writer for numeric-heavy tables
+_CSV_KW = dict(index=False, lineterminator='\n', chunksize=200_000)
+
+
+def fast_to_csv(df, path):
+    """Write a DataFrame to CSV, using the pyarrow writer when available."""
+    if pa is not None:
+        try:
+            opts = pa_csv.WriteOptions(quoting_style='none', quoting_header='none')
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path,
+                             write_options=opts)
+            return
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    df.to_csv(path, **_CSV_KW)
+
+# Patterns for natural chromosome ordering (e.g. 1A, 2B, 10D)
+_CHROM_NUM_RE = re.compile(r'\d+')
+_CHROM_LETTER_RE = re.compile(r'[ABD]')
+
+# First ID=/gene_id=/Name= attribute of a GFF record, in one pass
+_GFF_GENE_ID_PATTERN = r'(?:^|;)\s*(?:ID|gene_id|Name)=([^;]+)'
+_GFF_GENE_ID_RE = re.compile(_GFF_GENE_ID_PATTERN)
+
+# Score types in classification order and their Set2 colors (exactly the
+# palette used by the R script), shared by every plot builder
+SCORE_TYPES = ['A', 'B', 'AB', 'NAB', 'AXB']
+CLASS_COLORS = {
+    'A': '#66c2a5',
+    'B': '#e78ac3',
+    'AB': '#fc8d62',
+    'NAB': '#a6d854',
+    'AXB': '#8da0cb'
+}
+DEFAULT_CLASS_COLOR = '#999999'
+
+# Minimum row count before per-chromosome work is dispatched to a process
+# pool; below this the pickling overhead outweighs the parallel gain
+_PARALLEL_MIN_ROWS = 50000
+
+# Axes with at least this many gene/interval patches are rasterized on
+# save, collapsing thousands of PDF paths into one image while the text
+# and axes stay vector; sparser axes stay fully vector
+_RASTERIZE_MIN_PATCHES = 1000
+
+
+def _resolve_overlaps_for_chrom(starts, ends, classes, genes):
+    """Sweep one chromosome's sorted genes; return resolved ends and drops.
+
+    Pure module-level helper so it can be pickled to pool workers.
+    """
+    new_ends = {}
+    drop_genes = []
+
+    cur = 0
+    cur_end = ends[0]
+    for i in range(1, len(starts)):
+        if cur_end >= starts[i]:
+            if classes[cur] == classes[i]:
+                # Merge overlapping genes with same classification
+                cur_end = max(cur_end, ends[i])
+                new_ends[genes[cur]] = cur_end
+
+                # Remove the second gene
+                drop_genes.append(genes[i])
+                continue
+            else:
+                # Adjust end position for different classifications
+                new_ends[genes[cur]] = starts[i] - 1
+
+        cur = i
+        cur_end = ends[i]
+
+    return new_ends, drop_genes
+
+
+@njit(cache=True)
+def _merge_intervals_kernel(starts, ends, codes, chr_length, intergenic_code):
+    """Merge one chromosome's sorted, class-coded segments in a single scan.
+
+    Collapses the three passes of the original interval builder (merge
+    same-class neighbours, insert flanking/gap regions, re-merge adjacent
+    same-class output) into int64 array sweeps that numba can compile;
+    without numba it runs as plain Python with identical results.
+    """
+    n = len(starts)
+
+    # Merge overlapping and adjacent same-class genes
+    m_starts = np.empty(n, np.int64)
+    m_ends = np.empty(n, np.int64)
+    m_codes = np.empty(n, np.int64)
+    m = 0
+    cur_start = starts[0]
+    cur_end = ends[0]
+    cur_code = codes[0]
+    for i in range(1, n):
+        if codes[i] == cur_code and starts[i] <= cur_end + 1:
+            if ends[i] > cur_end:
+                cur_end = ends[i]
+        else:
+            m_starts[m] = cur_start
+            m_ends[m] = cur_end
+            m_codes[m] = cur_code
+            m += 1
+            cur_start = starts[i]
+            cur_end = ends[i]
+            cur_code = codes[i]
+    m_starts[m] = cur_start
+    m_ends[m] = cur_end
+    m_codes[m] = cur_code
+    m += 1
+
+    # Emit segments plus flanking and gap regions, merging contiguous
+    # same-class output on the fly (gaps inherit the preceding class)
+    out_starts = np.empty(2 * m + 2, np.int64)
+    out_ends = np.empty(2 * m + 2, np.int64)
+    out_codes = np.empty(2 * m + 2, np.int64)
+    k = 0
+    if m_starts[0] > 1:
+        out_starts[k] = 1
+        out_ends[k] = m_starts[0] - 1
+        out_codes[k] = intergenic_code
+        k += 1
+    for i in range(m):
+        s = m_starts[i]
+        e = m_ends[i]
+        c = m_codes[i]
+        if k > 0 and out_codes[k - 1] == c and s == out_ends[k - 1] + 1:
+            out_ends[k - 1] = e
+        else:
+            out_starts[k] = s
+            out_ends[k] = e
+            out_codes[k] = c
+            k += 1
+        if i < m - 1:
+            gap_start = m_ends[i] + 1
+            gap_end = m_starts[i + 1] - 1
+            if gap_start <= gap_end:
+                if k > 0 and out_codes[k - 1] == c and gap_start == out_ends[k - 1] + 1:
+                    out_ends[k - 1] = gap_end
+                else:
+                    out_starts[k] = gap_start
+                    out_ends[k] = gap_end
+                    out_codes[k] = c
+                    k += 1
+    if chr_length > 0 and m_ends[m - 1] < chr_length:
+        tail_start = m_ends[m - 1] + 1
+        if k > 0 and out_codes[k - 1] == intergenic_code and tail_start == out_ends[k - 1] + 1:
+            out_ends[k - 1] = chr_length
+        else:
+            out_starts[k] = tail_start
+            out_ends[k] = chr_length
+            out_codes[k] = intergenic_code
+            k += 1
+    return out_starts[:k], out_ends[:k], out_codes[:k]
+
+
+def _build_intervals_for_chrom(chrom, starts, ends, classes, chr_length):
+    """Build one chromosome's merged gene/intergenic interval rows.
+
+    Pure module-level helper so it can be pickled to pool workers; the
+    classes are factorized to int codes so the merge kernel stays
+    numba-compatible.
+    """
+    class_codes, class_names = pd.factorize(classes)
+    names = list(class_names) + ['Intergenic']
+
+    out_starts, out_ends, out_codes = _merge_intervals_kernel(
+        starts.astype(np.int64), ends.astype(np.int64),
+        class_codes.astype(np.int64),
+        np.int64(-1 if chr_length is None else chr_length),
+        np.int64(len(class_names)))
+
+    return [(chrom, int(seg_start), int(seg_end), names[code])
+            for seg_start, seg_end, code in zip(out_starts, out_ends, out_codes)]
+
+
+@functools.lru_cache(maxsize=4)
+def _load_chromosome_lengths(gff_file, mtime):
+    """Scan a GFF's ##sequence-region directives once per (path, mtime)."""
+    lengths = {}
+    with open(gff_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('##sequence-region'):
+                parts = line.strip().split()
+                if len(parts) >= 4:
+                    lengths[parts[1]] = int(parts[3])
+    return lengths
+
+
+@functools.lru_cache(maxsize=4)
+def _load_gff_genes(gff_file, mtime):
+    """Parse a GFF's gene features once per (path, mtime).
+
+    Batch samples share one genome, so repeat calls reuse the parsed
+    frame; callers must not mutate the returned DataFrame.
+    """
+    if pl is not None:
+        return _read_gff_genes_polars(gff_file)
+    return _read_gff_genes_python(gff_file)
+
+
+def _read_gff_genes_polars(gff_file):
+    """Parse gene features with Polars' native CSV reader"""
+    columns = ['Chromosome', 'source', 'feature', 'Start', 'End',
+               'score', 'Strand', 'frame', 'attributes']
+    gff = pl.read_csv(
+        gff_file, separator='\t', has_header=False, comment_prefix='#',
+        new_columns=columns, quote_char=None,
+        schema_overrides={'Start': pl.Int64, 'End': pl.Int64},
+        truncate_ragged_lines=True
+    )
+
+    # Only process gene features (exactly like R)
+    gff = gff.filter(pl.col('feature') == 'gene')
+
+    # Extract the gene ID from the first ID=/gene_id=/Name= attribute
+    gff = gff.with_columns(
+        pl.col('attributes')
+          .str.extract(_GFF_GENE_ID_PATTERN, 1)
+          .alias('Gene'),
+        (pl.col('End') - pl.col('Start') + 1).alias('Length')
+    )
+    gff = gff.filter(pl.col('Gene').is_not_null())
+
+    return gff.select(['Gene', 'Chromosome', 'Start', 'End', 'Length', 'Strand']).to_pandas()
+
+
+def _read_gff_genes_python(gff_file):
+    """Parse gene features line by line (fallback when Polars is missing)"""
+    gff_data = []
+
+    with open(gff_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+
+            parts = line.strip().split('\t')
+            if len(parts) < 9:
+                continue
+
+            # Only process gene features (exactly like R)
+            if parts[2] != 'gene':
+                continue
+
+            seqname = parts[0]
+            feature_type = parts[2]
+            start = int(parts[3])
+            end = int(parts[4])
+            strand = parts[6]
+            attributes = parts[8]
+
+            # Parse attributes exactly like R, with a single regex pass
+            # instead of splitting and substring-testing every attribute
+            match = _GFF_GENE_ID_RE.search(attributes)
+            gene_id = match.group(1) if match else None
+
+            if gene_id:
+                gff_data.append({
+                    'Gene': gene_id,
+                    'Chromosome': seqname,
+                    'Start': start,
+                    'End': end,
+                    'Length': end - start + 1,
+                    'Strand': strand
+                })
+
+    return pd.DataFrame(gff_data)
+
+class ExactRReplication:
+    def __init__(self, high_threshold=0.8, medium_threshold=0.5, min_threshold=0.4, visual=True,
+                 output_format='csv', min_plot_rows=2):
+        self.high_threshold = high_threshold
+        self.medium_threshold = medium_threshold
+        self.min_threshold = min_threshold
+        self.visual = visual
+        self.output_format = output_format
+        self.min_plot_rows = min_plot_rows
+        self.chromosome_lengths = {}
+        # Filled by run_analysis so downstream passes don't rescan
+        self._chrom_order = None
+        self._n_with_pos = None
+        
+    def _read_chromosome_lengths(self, gff_file):
+        """Read chromosome lengths from the GFF header (replicating R's behavior)"""
+        self.chromosome_lengths.update(
+            _load_chromosome_lengths(gff_file, os.path.getmtime(gff_file)))
+
+    def read_gff_data(self, gff_file):
+        """Exactly replicate R's GFF reading functionality"""
+        print(f"Reading GFF file: {gff_file}")
+
+        self._read_chromosome_lengths(gff_file)
+
+        gff_df = _load_gff_genes(gff_file, os.path.getmtime(gff_file))
+
+        print(f"  Found {len(gff_df)} genes in GFF file")
+        print(f"  Found {len(self.chromosome_lengths)} chromosome lengths")
+
+        return gff_df
+
+    def check_and_resolve_overlaps(self, data):
+        """Exactly replicate R's overlap resolution logic"""
+        
+        resolved_data = data.copy()
+
+        chrom_args = []
+        for chrom in resolved_data['Chromosome'].unique():
+            chr_data = resolved_data[resolved_data['Chromosome'] == chrom].sort_values('Start')
+
+            if len(chr_data) < 2:
+                continue
+
+            chrom_args.append((chr_data['Start'].to_numpy(),
+                               chr_data['End'].to_numpy(),
+                               chr_data['Primary_Class'].to_numpy(),
+                               chr_data['Gene'].to_numpy()))
+
+        # Sweep each chromosome once; chromosomes are independent, so large
+        # inputs are fanned out across processes
+        if len(resolved_data) >= _PARALLEL_MIN_ROWS and len(chrom_args) > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(len(chrom_args), os.cpu_count() or 1)) as executor:
+                chrom_results = list(executor.map(_resolve_overlaps_for_chrom, *zip(*chrom_args)))
+        else:
+            chrom_results = [_resolve_overlaps_for_chrom(*args) for args in chrom_args]
+
+        new_ends = {}
+        drop_genes = set()
+        for chrom_new_ends, chrom_drop_genes in chrom_results:
+            new_ends.update(chrom_new_ends)
+            drop_genes.update(chrom_drop_genes)
+
+        # Write all resolved coordinates back in one pass
+        if new_ends:
+            mask = resolved_data['Gene'].isin(new_ends)
+            resolved_data.loc[mask, 'End'] = resolved_data.loc[mask, 'Gene'].map(new_ends)
+        if drop_genes:
+            resolved_data = resolved_data[~resolved_data['Gene'].isin(drop_genes)]
+
+        return resolved_data
+    
+    def create_gene_intervals(self, data):
+        """Exactly replicate R's gene interval creation logic"""
+        chrom_args = []
+        for chrom in data['Chromosome'].unique():
+            chr_data = data[data['Chromosome'] == chrom].sort_values('Start')
+
+            if len(chr_data) == 0:
+                continue
+
+            chrom_args.append((chrom,
+                               chr_data['Start'].to_numpy(),
+                               chr_data['End'].to_numpy(),
+                               chr_data['Primary_Class'].astype(str).to_numpy(),
+                               self.chromosome_lengths.get(chrom)))
+
+        # Chromosomes are independent; fan large inputs out across processes
+        if len(data) >= _PARALLEL_MIN_ROWS and len(chrom_args) > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(len(chrom_args), os.cpu_count() or 1)) as executor:
+                chrom_results = list(executor.map(_build_intervals_for_chrom, *zip(*chrom_args)))
+        else:
+            chrom_results = [_build_intervals_for_chrom(*args) for args in chrom_args]
+
+        intervals_list = [
+            pd.DataFrame(fully_merged_rows,
+                         columns=['Chromosome', 'Start', 'End', 'Primary_Class'])
+            for fully_merged_rows in chrom_results
+        ]
+        
+        # Combine intervals from all chromosomes
+        if intervals_list:
+            all_intervals = pd.concat(intervals_list, ignore_index=True)
+            all_intervals['Center'] = (all_intervals['Start'] + all_intervals['End']) / 2
+            all_intervals['Length'] = all_intervals['End'] - all_intervals['Start'] + 1
+            return all_intervals
+        else:
+            return pd.DataFrame(columns=['Chromosome', 'Start', 'End', 'Primary_Class', 'Center', 'Length'])
+    
+    def process_data(self, stats_file, gff_file, cache_dir=None):
+        """Exactly replicate R's data processing logic"""
+        print("Processing data...")
+
+        # Reuse the merged stats+GFF frame from a previous run when both
+        # inputs are unchanged (keyed on their modification times)
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, 'data_processed.feather')
+            if os.path.exists(cache_path):
+                inputs_mtime = max(os.path.getmtime(stats_file), os.path.getmtime(gff_file))
+                if os.path.getmtime(cache_path) > inputs_mtime:
+                    try:
+                        data_processed = pd.read_feather(cache_path)
+                    except Exception:
+                        pass  # unreadable cache: fall through to a full parse
+                    else:
+                        print(f"  Reusing cached processed data: {cache_path}")
+                        self._read_chromosome_lengths(gff_file)
+                        return data_processed
+
+        # Read gene stats data (exactly like R); prefer the pyarrow engine
+        sep = '\t' if stats_file.endswith('.txt') else ','
+        try:
+            data = pd.read_csv(stats_file, sep=sep, engine='pyarrow')
+        except (ImportError, ValueError):
+            data = pd.read_csv(stats_file, sep=sep)
+        
+        print(f"  Loaded {len(data)} genes from stats file")
+        
+        # Read GFF data
+        gff_df = self.read_gff_data(gff_file)
+        
+        # Merge with GFF information (left_join equivalent); share one
+        # categorical dtype so the join hashes int codes, not Python strings
+        gene_dtype = pd.CategoricalDtype(
+            pd.unique(pd.concat([data['Gene'], gff_df['Gene']], ignore_index=True)))
+        data['Gene'] = data['Gene'].astype(gene_dtype)
+        # assign() leaves the cached GFF frame untouched
+        gff_df = gff_df.assign(Gene=gff_df['Gene'].astype(gene_dtype))
+        data_processed = pd.merge(data, gff_df, on='Gene', how='left')
+        
+        # Calculate total score and ratios (exactly like R)
+        data_processed['Total_Score'] = (data_processed['A'] + data_processed['B'] + 
+                                        data_processed['AB'] + data_processed['NAB'] + 
+                                        data_processed['AXB'])
+        
+        # Calculate ratios and handle division by zero (exactly like R),
+        # as one masked divide over the score matrix instead of five
+        # divide-then-fillna column passes
+        ratio_cols = [f'{score_type}_ratio' for score_type in SCORE_TYPES]
+        score_matrix = data_processed[SCORE_TYPES].to_numpy(dtype=np.float64)
+        total = data_processed['Total_Score'].to_numpy(dtype=np.float64)[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data_processed[ratio_cols] = np.where(total > 0, score_matrix / total, 0.0)
+        
+        # Sort by chromosome and start position (exactly like R)
+        data_processed = data_processed.sort_values(['Chromosome', 'Start'])
+
+        # Compact dtypes: raw scores fit in small ints and the remaining
+        # string columns are low-cardinality. Coordinates and ratios stay
+        # float64 on purpose — Start/End need NaN plus >2^24 integer
+        # precision, and float32 ratios would flip threshold comparisons
+        # for genes sitting exactly on a confidence cut-off.
+        for col in SCORE_TYPES + ['Total_Score']:
+            data_processed[col] = pd.to_numeric(data_processed[col], downcast='integer')
+        for col in ['Chromosome', 'Strand']:
+            data_processed[col] = data_processed[col].astype('category')
+
+        # Check for unmatched genes (exactly like R)
+        unmatched_genes = data_processed[data_processed['Start'].isna()]['Gene']
+        if len(unmatched_genes) > 0:
+            print(f"Warning: {len(unmatched_genes)} genes could not be matched in GFF file")
+            print("These genes will be excluded from physical position-based analysis")
+
+        if cache_path is not None:
+            try:
+                data_processed.reset_index(drop=True).to_feather(cache_path)
+            except Exception:
+                pass  # feather support (pyarrow) unavailable: skip caching
+
+        return data_processed
+    
+    def classify_genes(self, data):
+        """Exactly replicate R's gene classification logic"""
+        print("Classifying genes...")
+        
+        # Find maximum ratio for each gene (exactly like R); argmax already
+        # visits every element, so the maxima are gathered from its result
+        # instead of a second full pass over the matrix
+        ratio_cols = ['A_ratio', 'B_ratio', 'AB_ratio', 'NAB_ratio', 'AXB_ratio']
+        ratio_matrix = data[ratio_cols].to_numpy()
+        max_idx = ratio_matrix.argmax(axis=1)
+        max_ratio = ratio_matrix[np.arange(len(ratio_matrix)), max_idx]
+        data['Max_Ratio'] = max_ratio
+
+        # Determine primary classification (exactly like R's case_when logic):
+        # argmax over the five ratio columns, with genes below min_threshold
+        # classified as NAB (Mixed in R is mapped to NAB)
+        class_labels = np.array(SCORE_TYPES)
+        data['Primary_Class'] = np.where(max_ratio < self.min_threshold,
+                                         'NAB', class_labels[max_idx])
+        
+        # Determine confidence level (exactly like R's case_when logic)
+        data['Confidence'] = np.select(
+            [max_ratio > self.high_threshold, max_ratio > self.medium_threshold],
+            ['High', 'Medium'], default='Low')
+        data['Composite_Class'] = data['Primary_Class'] + '_' + data['Confidence']
+        
+        # Calculate center position (exactly like R); NaN Start/End propagates
+        data['Center'] = (data['Start'] + data['End']) / 2
+        
+        # Set chromosome order as factor (like in R); compute the sort key
+        # once per unique chromosome with precompiled patterns
+        def chrom_sort_key(x):
+            num_match = _CHROM_NUM_RE.search(x)
+            letter_match = _CHROM_LETTER_RE.search(x)
+            num = int(num_match.group()) if num_match else float('inf')
+            letter = letter_match.group() if letter_match else ''
+            return (num, letter)
+
+        chrom_keys = {c: chrom_sort_key(c) for c in data['Chromosome'].dropna().unique()}
+        chrom_order = sorted(chrom_keys, key=chrom_keys.get)
+        data['Chromosome'] = pd.Categorical(data['Chromosome'], categories=chrom_order, ordered=True)
+        
+        return data
+    
+    def create_chromosome_facet_plot(self, data, confidence_description):
+        """Exactly replicate R's chromosome facet plot"""
+        # Get unique chromosomes
+        chromosomes = sorted(data['Chromosome'].dropna().unique())
+
+        classes = sorted(data['Primary_Class'].unique())
+        color_dict = {cls: CLASS_COLORS.get(cls, DEFAULT_CLASS_COLOR) for cls in classes}
+
+        # One dense chromosome x class count matrix, indexed per subplot
+        # below instead of re-filtering the grouped counts per chromosome
+        count_matrix = (data.pivot_table(index='Chromosome', columns='Primary_Class',
+                                         aggfunc='size', fill_value=0)
+                        .reindex(index=chromosomes, columns=classes, fill_value=0)
+                        .to_numpy())
+        
+        # Create figure with subplots for each chromosome
+        n_chromosomes = len(chromosomes)
+        n_cols = min(4, n_chromosomes)
+        n_rows = (n_chromosomes + n_cols - 1) // n_cols
+        
+        fig, axes = plt.subplots(n_rows, n_cols, figsize=(4*n_cols, 3*n_rows))
+        if n_rows == 1 and n_cols == 1:
+            axes = np.array([axes])
+        axes = axes.flatten()
+        
+        for idx, chrom in enumerate(chromosomes):
+            if idx < len(axes):
+                ax = axes[idx]
+
+                # Create bars for each class
+                bar_positions = np.arange(len(classes))
+                for i, cls in enumerate(classes):
+                    ax.bar(bar_positions[i], count_matrix[idx, i],
+                           color=color_dict[cls], label=cls if idx == 0 else "")
+                
+                ax.set_xlabel(f'{chrom}')
+                if idx % n_cols == 0:
+                    ax.set_ylabel('Gene Count')
+                ax.set_xticks(bar_positions)
+                ax.set_xticklabels(classes, rotation=45)
+                ax.grid(axis='y', alpha=0.3)
+        
+        # Hide empty subplots
+        for idx in range(len(chromosomes), len(axes)):
+            axes[idx].set_visible(False)
+        
+        plt.suptitle(f'Gene Classification Distribution by Chromosome ({confidence_description})', 
+                    fontsize=16, y=0.98)
+        plt.tight_layout(rect=[0, 0, 0.9, 0.95])
+        
+        return fig
+    
+    def create_physical_heatmap(self, data, confidence_description):
+        """Exactly replicate R's physical heatmap"""
+        # Filter valid data
+        valid_data = data[data['Start'].notna()].copy()
+        
+        if valid_data.empty:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.text(0.5, 0.5, 'No valid physical position data', 
+                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
+            ax.set_title(f'Gene Classification by Physical Position ({confidence_description})')
+            return fig
+        
+        
+        # Create figure
+        chromosomes = sorted(valid_data['Chromosome'].unique())
+        n_chromosomes = len(chromosomes)
+        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
+        if n_chromosomes == 1:
+            axes = [axes]
+        
+        for idx, chrom in enumerate(chromosomes):
+            ax = axes[idx]
+            chrom_data = valid_data[valid_data['Chromosome'] == chrom]
+            
+            # Draw all genes of each class as one collection (exactly like
+            # R's geom_tile) instead of one Rectangle patch per gene
+            starts_mb = chrom_data['Start'].to_numpy() / 1e6
+            widths_mb = (chrom_data['End'].to_numpy() - chrom_data['Start'].to_numpy()) / 1e6
+            class_values, class_codes = np.unique(chrom_data['Primary_Class'].to_numpy(),
+                                                  return_inverse=True)
+            rasterize = len(chrom_data) >= _RASTERIZE_MIN_PATCHES
+            for code, cls in enumerate(class_values):
+                cls_mask = class_codes == code
+                bars = ax.broken_barh(np.column_stack([starts_mb[cls_mask], widths_mb[cls_mask]]),
+                                      (0, 1), facecolors=CLASS_COLORS.get(cls, DEFAULT_CLASS_COLOR),
+                                      alpha=0.7, edgecolor='none')
+                bars.set_rasterized(rasterize)
+
+            ax.set_ylabel(f'Chr{chrom}')
+            ax.set_xlim(0, valid_data['End'].max() / 1e6)
+            ax.set_ylim(0, 1)
+            ax.set_yticks([0.4])
+            ax.set_yticklabels([f'Chr{chrom}'])
+            ax.grid(axis='x', alpha=0.3)
+            
+            if idx == n_chromosomes - 1:
+                ax.set_xlabel('Physical Position (Mb)')
+        
+        plt.suptitle(f'Gene Classification by Physical Position ({confidence_description})', 
+                    fontsize=16, y=0.95)
+        plt.tight_layout(rect=[0, 0, 0.95, 0.95])
+        
+        # Add legend
+        from matplotlib.patches import Patch
+        legend_elements = [Patch(facecolor=color, label=cls) 
+                         for cls, color in CLASS_COLORS.items()]
+        fig.legend(handles=legend_elements, loc='upper right', 
+                  bbox_to_anchor=(0.98, 0.98))
+        
+        return fig
+    
+    def create_adjacent_gene_plot(self, data, confidence_description):
+        """Exactly replicate R's adjacent gene region plot"""
+        intervals_data = self.create_gene_intervals(data)
+        
+        if intervals_data.empty:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.text(0.5, 0.5, 'No adjacent gene region data', 
+                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
+            ax.set_title(f'Adjacent Gene Region Classification ({confidence_description})')
+            return fig
+        
+        # Filter out intergenic regions (exactly like R)
+        gene_intervals = intervals_data[intervals_data['Primary_Class'] != 'Intergenic']
+        
+        if gene_intervals.empty:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.text(0.5, 0.5, 'No gene region data', 
+                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
+            ax.set_title(f'Adjacent Gene Region Classification ({confidence_description})')
+            return fig
+        
+        
+        # Create figure
+        chromosomes = sorted(gene_intervals['Chromosome'].unique())
+        n_chromosomes = len(chromosomes)
+        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
+        if n_chromosomes == 1:
+            axes = [axes]
+        
+        for idx, chrom in enumerate(chromosomes):
+            ax = axes[idx]
+            chrom_data = gene_intervals[gene_intervals['Chromosome'] == chrom]
+            
+            # One collection per class instead of one patch per interval
+            starts_mb = chrom_data['Start'].to_numpy() / 1e6
+            widths_mb = (chrom_data['End'].to_numpy() - chrom_data['Start'].to_numpy()) / 1e6
+            class_values, class_codes = np.unique(chrom_data['Primary_Class'].to_numpy(),
+                                                  return_inverse=True)
+            rasterize = len(chrom_data) >= _RASTERIZE_MIN_PATCHES
+            for code, cls in enumerate(class_values):
+                cls_mask = class_codes == code
+                bars = ax.broken_barh(np.column_stack([starts_mb[cls_mask], widths_mb[cls_mask]]),
+                                      (0, 1), facecolors=CLASS_COLORS.get(cls, DEFAULT_CLASS_COLOR),
+                                      alpha=0.7, edgecolor='none')
+                bars.set_rasterized(rasterize)
+
+            ax.set_ylabel(f'Chr{chrom}')
+            ax.set_xlim(0, gene_intervals['End'].max() / 1e6)
+            ax.set_ylim(0, 1)
+            ax.set_yticks([0.4])
+            ax.set_yticklabels([f'Chr{chrom}'])
+            ax.grid(axis='x', alpha=0.3)
+            
+            if idx == n_chromosomes - 1:
+                ax.set_xlabel('Physical Position (Mb)')
+        
+        plt.suptitle(f'Adjacent Gene Region Classification ({confidence_description})', 
+                    fontsize=16, y=0.95)
+        plt.tight_layout(rect=[0, 0, 1, 0.95])
+                
+                # Add legend
+        from matplotlib.patches import Patch
+        legend_elements = [Patch(facecolor=color, label=cls) 
+                         for cls, color in CLASS_COLORS.items()]
+        fig.legend(handles=legend_elements, loc='upper right', 
+                  bbox_to_anchor=(0.98, 0.98))
+        
+        return fig
+    
+    def create_score_ratio_plot(self, data, confidence_description):
+        """Exactly replicate R's score ratio line plot"""
+        # Prepare data for plotting (exactly like R's pivot_longer), reshaping
+        # the five ratio columns in one melt instead of a per-gene loop
+        ratio_cols = [f'{score_type}_ratio' for score_type in SCORE_TYPES]
+        valid_data = data.loc[data['Center'].notna(), ['Chromosome', 'Center'] + ratio_cols].copy()
+        valid_data['Position_Mb'] = valid_data['Center'] / 1e6
+
+        if valid_data.empty:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.text(0.5, 0.5, 'No valid position data for score ratios',
+                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
+            ax.set_title(f'Gene Classification Score Ratio ({confidence_description})')
+            return fig
+
+        plot_df = valid_data.melt(id_vars=['Chromosome', 'Position_Mb'], value_vars=ratio_cols,
+                                  var_name='Score_Type', value_name='Ratio')
+        plot_df['Score_Type'] = plot_df['Score_Type'].str.replace('_ratio', '', regex=False)
+
+        score_order = ['A', 'AB', 'AXB', 'B', 'NAB']
+    
+        # Create figure with subplots for each chromosome
+        chromosomes = sorted(plot_df['Chromosome'].unique())
+        n_chromosomes = len(chromosomes)
+    
+        legend_elements = []
+        for score_type in score_order:
+            legend_elements.append(plt.Line2D([0], [0], color=CLASS_COLORS[score_type], lw=2, label=score_type))
+    
+        if n_chromosomes == 0:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.text(0.5, 0.5, 'No chromosome data for score ratios', 
+                   ha='center', va='center', transform=ax.transAxes, fontsize=12)
+            ax.set_title(f'Gene Classification Score Ratio ({confidence_description})')
+            return fig
+    
+        fig, axes = plt.subplots(n_chromosomes, 1, figsize=(20, 1 * n_chromosomes + 1))
+    
+        if n_chromosomes == 1:
+            axes = [axes]
+        else:
+            axes = axes.flatten()
+    
+        for idx, chrom in enumerate(chromosomes):
+            ax = axes[idx]
+            chrom_data = plot_df[plot_df['Chromosome'] == chrom].sort_values('Position_Mb')
+        
+            # Plot each score type (exactly like R)
+            for score_type in score_order:
+                score_data = chrom_data[chrom_data['Score_Type'] == score_type]
+                if len(score_data) > 0:
+                    ax.plot(score_data['Position_Mb'], score_data['Ratio'], 
+                           color=CLASS_COLORS[score_type], alpha=0.7, linewidth=1)
+        
+            ax.set_title(f'Chromosome {chrom}')
+            ax.set_xlabel('Position (Mb)')
+            ax.set_ylabel('Score Ratio')
+            ax.set_ylim(0, 1)
+            ax.grid(alpha=0.3)
+    
+        fig.legend(handles=legend_elements, 
+                   loc='lower center', 
+                   bbox_to_anchor=(0.5, 0.02),
+                   ncol=5,
+                   fontsize=10)
+    
+        plt.suptitle(f'Gene Classification Score Ratio ({confidence_description})', 
+                fontsize=16, y=0.98)
+    
+        plt.tight_layout(rect=[0, 0.05, 1, 0.98])
+    
+        return fig
+    
+    def create_confidence_comparison(self, data, confidence_description):
+        """Exactly replicate R's confidence comparison (pie charts)"""
+        # Filter data for different confidence levels
+        data_high = data[data['Confidence'] == 'High']
+        data_medium_above = data[data['Confidence'].isin(['High', 'Medium'])]
+        data_all = data
+
+        datasets = [
+            (data_high, f'High Confidence\n(> {self.high_threshold:.0%})'),
+            (data_medium_above, f'Medium Confidence\n(> {self.medium_threshold:.0%})'),
+            (data_all, 'All Confidence Levels')
+        ]
+        
+        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+        
+        for i, (dataset, title) in enumerate(datasets):
+            ax = axes[i]
+            if len(dataset) > 0:
+                class_counts = dataset['Primary_Class'].value_counts()
+                
+                pie_colors = [CLASS_COLORS.get(cls, DEFAULT_CLASS_COLOR)
+                              for cls in class_counts.index]
+
+                wedges, texts, autotexts = ax.pie(class_counts.values, labels=class_counts.index, 
+                                                autopct='%1.1f%%', colors=pie_colors, startangle=90)
+                ax.set_title(title, fontsize=14, y=-0.15)
+                
+                # Improve text appearance
+                for autotext in autotexts:
+                    autotext.set_color('white')
+                    autotext.set_fontweight('bold')
+            else:
+                ax.text(0.5, 0.5, 'No Data', ha='center', va='center', 
+                       transform=ax.transAxes, fontsize=12)
+                ax.set_title(title, fontsize=14)
+        
+        plt.suptitle(f'Gene Classification by Confidence Level ({confidence_description})', 
+                    fontsize=16, y=0.95)
+        plt.tight_layout()
+        
+        return fig
+    
+    def generate_summary_statistics(self, data, data_with_position, data_high_only,
+                                  data_medium_above, data_all_confidence, out_stream):
+        """Exactly replicate R's summary statistics format, written to out_stream"""
+        first_line = True
+
+        def emit(line):
+            # Newline-separated like the old '\n'.join, no trailing newline
+            nonlocal first_line
+            if first_line:
+                first_line = False
+            else:
+                line = '\n' + line
+            out_stream.write(line)
+
+        n_with_pos = self._n_with_pos
+        if n_with_pos is None:
+            n_with_pos = len(data_with_position)
+
+        emit("GFF-based Gene Classification Statistical Summary:")
+        emit("==================================================")
+        emit(f"Total number of genes: {len(data)}")
+        emit(f"Genes successfully matched with physical positions: {n_with_pos}")
+        emit(f"Genes without physical position matches: {len(data) - n_with_pos}")
+        
+        # Single pass over Chromosome: the sorted names and per-chromosome
+        # gene counts are reused by the chromosome sections below
+        chromosomes = []
+        chrom_counts = pd.Series(dtype='int64')
+        if n_with_pos > 0:
+            chrom_counts = data_with_position.groupby('Chromosome', observed=True).size().sort_index()
+            chromosomes = self._chrom_order
+            if chromosomes is None:
+                chromosomes = list(chrom_counts.index)
+            emit(f"Chromosomes involved: {', '.join(chromosomes)}")
+        
+        emit("\nGene counts by confidence level (High confidence threshold > 80%):")
+        emit("==============================================================")
+        
+        if n_with_pos > 0:
+            # np.unique counts in one C pass and already sorts the labels,
+            # matching the old value_counts().sort_index() order; the lines
+            # are then assembled with array ops instead of per-row f-strings
+            conf_values, conf_counts = np.unique(
+                data_with_position['Confidence'].to_numpy(), return_counts=True)
+            percentages = np.char.mod('%.1f', (conf_counts / n_with_pos) * 100)
+            for line in (conf_values.astype(object) + ': '
+                         + conf_counts.astype(str).astype(object)
+                         + ' (' + percentages.astype(object) + '%)'):
+                emit(line)
+        else:
+            emit("No valid physical position data")
+        
+        emit("\nCumulative confidence statistics (High confidence threshold > 80%):")
+        emit("===============================================================")
+        emit(f"High confidence gene count (threshold > 80%): {len(data_high_only)}")
+        emit(f"Medium and above confidence gene count: {len(data_medium_above)}")
+        emit(f"All confidence level gene count: {len(data_all_confidence)}")
+        
+        emit("\nStatistics by primary classification (Mixed classification categorized as NAB):")
+        emit("==================================================================================")
+        
+        if n_with_pos > 0:
+            # factorize + bincount replaces value_counts; the stable argsort
+            # keeps the count-descending, first-occurrence-on-ties order
+            class_codes, class_names = pd.factorize(
+                data_with_position['Primary_Class'].to_numpy())
+            class_counts = np.bincount(class_codes)
+            order = np.argsort(-class_counts, kind='stable')
+            percentages = np.char.mod('%.1f', (class_counts[order] / n_with_pos) * 100)
+            for line in (class_names[order].astype(object) + ': '
+                         + class_counts[order].astype(str).astype(object)
+                         + ' (' + percentages.astype(object) + '%)'):
+                emit(line)
+        else:
+            emit("No valid physical position data")
+        
+        emit("\nChromosome length statistics:")
+        if n_with_pos > 0:
+            lengths = np.array([self.chromosome_lengths.get(chrom, -1)
+                                for chrom in chromosomes], dtype=np.float64)
+            known = lengths >= 0
+            if known.any():
+                names = np.asarray(chromosomes, dtype=object)[known]
+                lengths_mb = np.char.mod('%.2f', lengths[known] / 1e6)
+                # Align counts by label: chromosomes is lexicographically
+                # sorted while chrom_counts follows the categorical order
+                counts = chrom_counts.reindex(chromosomes).to_numpy()[known]
+                for line in ('Chromosome ' + names + ': Length '
+                             + lengths_mb.astype(object) + ' Mb, Gene count '
+                             + counts.astype(str).astype(object)):
+                    emit(line)
+        else:
+            emit("No valid physical position data")
+        
+    def create_combined_plots(self, data, confidence_level, confidence_description, output_dir):
+        """Create all plots for a specific confidence level and combine them"""
+        print(f"  Creating plots for {confidence_level}")
+    
+        if not self.visual:
+            print(f"  Visualization disabled, skipping plot creation")
+            return True
+    
+        plot_prefix = confidence_level.lower().replace(' ', '_')
+
+        # Build each figure lazily and release it as soon as it is saved, so
+        # only one figure's artist tree is alive at a time. All four figures
+        # go into one multi-page PDF per confidence level, sharing a single
+        # file open and font/resource dictionary.
+        plot_builders = [
+            self.create_chromosome_facet_plot,
+            self.create_physical_heatmap,
+            self.create_adjacent_gene_plot,
+            self.create_score_ratio_plot,
+        ]
+
+        with PdfPages(os.path.join(output_dir, f'plots_{plot_prefix}.pdf')) as pdf:
+            for builder in plot_builders:
+                fig = builder(data, confidence_description)
+                # PDF output is vector; dpi only sizes rasterized layers
+                pdf.savefig(fig, bbox_inches='tight', dpi=150)
+                plt.close(fig)
+
+        if confidence_level == "All Confidence":
+            fig = self.create_confidence_comparison(data, confidence_description)
+            fig.savefig(os.path.join(output_dir, 'confidence_pie.pdf'),
+                        bbox_inches='tight', dpi=150)
+            plt.close(fig)
+
+        return True
+    
+    def _dump(self, df, base_path):
+        """Write a result table as CSV, Parquet or both (self.output_format)."""
+        if self.output_format != 'csv':
+            df.to_parquet(base_path + '.parquet', compression='snappy', index=False)
+        if self.output_format != 'parquet':
+            fast_to_csv(df, base_path + '.csv')
+
+    def run_analysis(self, stats_file, gff_file, output_dir, sample_name):
+        """Main analysis function - exactly replicates R script functionality"""
+        print(f"Starting comprehensive gene classification analysis for {sample_name}")
+        print(f"Visualization enabled: {'Yes' if self.visual else 'No'}")
+        
+        # Create output directory
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Process data (exactly like R)
+        data_processed = self.process_data(stats_file, gff_file, cache_dir=output_dir)
+        
+        # Classify genes (exactly like R)
+        data_classified = self.classify_genes(data_processed)
+        
+        # Filter data with positions (exactly like R); no .copy() needed,
+        # check_and_resolve_overlaps already works on its own copy
+        data_with_position = data_classified[data_classified['Start'].notna()]
+
+        # Check and resolve overlapping genes (exactly like R)
+        data_with_position = self.check_and_resolve_overlaps(data_with_position)
+
+        # Cache once for the summary pass; plot builders keep their own
+        # per-subset lists because a confidence subset can lack chromosomes
+        self._chrom_order = sorted(data_with_position['Chromosome'].dropna().unique())
+        self._n_with_pos = len(data_with_position)
+
+        # Create confidence level datasets (exactly like R); one pass over
+        # the raw Confidence values feeds both subset masks
+        confidence = data_with_position['Confidence'].to_numpy()
+        is_high = confidence == 'High'
+        data_high_only = data_with_position.take(np.flatnonzero(is_high))
+        data_medium_above = data_with_position.take(np.flatnonzero(is_high | (confidence == 'Medium')))
+        data_all_confidence = data_with_position
+        
+        # Create plots for each confidence level (exactly like R)
+        if self.visual:
+            confidence_levels = [
+                (data_high_only, "High Confidence", "Only high confidence genes (threshold > 80%)"),
+                (data_medium_above, "Medium Confidence", "Contains medium and high confidence genes (threshold > 50%)"),
+                (data_all_confidence, "All Confidence", "Contains all confidence genes (High+Medium+Low)")
+            ]
+            
+            plot_jobs = []
+            for data, level, description in confidence_levels:
+                if len(data) >= self.min_plot_rows:
+                    plot_jobs.append((data, level, description))
+                else:
+                    print(f"  Skipping {level} plots: only {len(data)} genes "
+                          f"(minimum {self.min_plot_rows})")
+
+            # The confidence levels are independent; render them in parallel
+            # worker processes when there is more than one to draw
+            if len(plot_jobs) > 1 and (os.cpu_count() or 1) > 1:
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=min(len(plot_jobs), os.cpu_count() or 1)) as executor:
+                    futures = [executor.submit(self.create_combined_plots,
+                                               data, level, description, output_dir)
+                               for data, level, description in plot_jobs]
+                    for future in futures:
+                        future.result()
+            else:
+                for data, level, description in plot_jobs:
+                    self.create_combined_plots(data, level, description, output_dir)
+        
+        # Generate summary statistics (exactly like R), streamed straight
+        # to the buffered file handle instead of joining a list of lines
+        summary_path = os.path.join(output_dir, 'analysis_summary.txt')
+        with open(summary_path, 'w', encoding='utf-8', buffering=1024*1024) as f:
+            self.generate_summary_statistics(
+                data_classified, data_with_position, data_high_only,
+                data_medium_above, data_all_confidence, f
+            )
+        
+        # Save detailed data files (exactly like R)
+        self._dump(data_classified, os.path.join(output_dir, 'gff_based_gene_classification'))
+        self._dump(data_with_position, os.path.join(output_dir, 'gff_based_gene_classification_with_position'))
+        
+        # Save by confidence level (exactly like R)
+        self._dump(data_high_only, os.path.join(output_dir, 'gff_based_gene_classification_high_only'))
+        self._dump(data_medium_above, os.path.join(output_dir, 'gff_based_gene_classification_medium_and_above'))
+        self._dump(data_all_confidence, os.path.join(output_dir, 'gff_based_gene_classification_all_confidence'))
+        
+        # Save gene intervals data (exactly like R)
+        intervals_high = self.create_gene_intervals(data_high_only)
+        intervals_medium = self.create_gene_intervals(data_medium_above)
+        intervals_all = self.create_gene_intervals(data_all_confidence)
+        
+        self._dump(intervals_high, os.path.join(output_dir, 'gene_intervals_high_confidence'))
+        self._dump(intervals_medium, os.path.join(output_dir, 'gene_intervals_medium_confidence'))
+        self._dump(intervals_all, os.path.join(output_dir, 'gene_intervals_all_confidence'))
+        
+        # Print completion message (exactly like R)
+        print(f"\nAnalysis completed! All results saved to: {output_dir}")
+        if self.visual:
+            print("Visualization charts have been generated and saved as PDF files.")
+        else:
+            print("Visualization was disabled. No plot files were generated.")
+        print("Note: High confidence threshold is set to > 80%, Mixed classification is categorized as NAB.")
+        print("Chromosome-faceted classification distribution charts and gene classification score ratio line charts use unfiltered data (all confidence levels).")
+        print("Adjacent segments with the same classification are now merged into continuous segments, and overlapping gene issues have been resolved.")
+        
+        return True
+
+@functools.lru_cache(maxsize=None)
+def _sample_name_from(stats_file):
+    """Derive the sample name from a stats filename (memoized)."""
+    filename = os.path.basename(stats_file)
+    if filename.startswith('gene_stats_'):
+        return filename.replace('gene_stats_', '').replace('.txt', '').replace('.csv', '')
+    return os.path.splitext(filename)[0]
+
+
+# One analyzer per batch worker process; thresholds are constant across a
+# batch and run_analysis resets its per-sample state, so reuse is safe
+_batch_analyzer = None
+
+
+def _process_one(stats_file, args, visual):
+    """Run the full analysis for one sample file in batch mode.
+
+    Module-level so it can be dispatched to pool workers; returns
+    (sample_name, success, error_message).
+    """
+    sample_name = _sample_name_from(stats_file)
+
+    # Create sample-specific output directory
+    sample_output_dir = os.path.join(args.output, sample_name)
+    os.makedirs(sample_output_dir, exist_ok=True)
+
+    print(f"\nProcessing sample: {sample_name}")
+    print(f"  Input: {stats_file}")
+    print(f"  Output: {sample_output_dir}")
+
+    # Initialize the analyzer once per worker and reuse it across samples
+    global _batch_analyzer
+    if _batch_analyzer is None:
+        _batch_analyzer = ExactRReplication(
+            high_threshold=args.High,
+            medium_threshold=args.Medium,
+            min_threshold=args.Min,
+            visual=visual,
+            output_format=args.fmt,
+            min_plot_rows=args.min_plot_rows
+        )
+    analyzer = _batch_analyzer
+
+    try:
+        success = analyzer.run_analysis(stats_file, args.genome, sample_output_dir, sample_name)
+        return sample_name, success, None
+    except Exception as e:
+        return sample_name, False, str(e)
+
+
+def _init_batch_worker():
+    """Warm per-worker matplotlib state once (Agg canvas and font cache)."""
+    plt.figure()
+    plt.close('all')
+
+
+def main():
+    # Fork workers on POSIX so they inherit the parent's already-imported
+    # matplotlib/pandas/numpy instead of re-importing them per process
+    if sys.platform.startswith('linux'):
+        import multiprocessing as mp
+        mp.set_start_method('fork', force=True)
+
+    parser = argparse.ArgumentParser(description='POAtools - Step 4: Exact R Replication Gene Classification Analysis')
+    parser.add_argument('-i', '--input', required=True, help='Input gene stats file or directory (txt or csv)')
+    parser.add_argument('-genome', required=True, help='Reference genome GFF file')
+    parser.add_argument('-O', '--output', default='./r_style_visualization', help='Output directory')
+    parser.add_argument('-High', type=float, default=0.8, help='High confidence threshold (default: 0.8)')
+    parser.add_argument('-Medium', type=float, default=0.5, help='Medium confidence threshold (default: 0.5)')
+    parser.add_argument('-Min', type=float, default=0.4, help='Minimum confidence threshold (default: 0.4)')
+    parser.add_argument('-v', '--visual', default='T', help='Enable/disable visualization (T/F, default: T)')
+    parser.add_argument('-batch', action='store_true', help='Batch process all files in input directory')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Samples to process in parallel in batch mode (default: all CPUs)')
+    parser.add_argument('--fmt', choices=['csv', 'parquet', 'both'], default='csv', help='Output table format (default: csv)')
+    parser.add_argument('--min-plot-rows', type=int, default=2, help='Skip plotting confidence levels with fewer genes (default: 2)')
+    
+    args = parser.parse_args()
+    
+    # Process visualization parameter
+    visual = True
+    if args.visual.upper() == 'F':
+        visual = False
+    elif args.visual.upper() == 'T':
+        visual = True
+    else:
+        print(f"Error: Invalid value for -v parameter. Use T or F.")
+        sys.exit(1)
+    
+    # Check if input is a directory for batch processing
+    if os.path.isdir(args.input) and args.batch:
+        print(f"Batch processing mode: Processing all gene stats files in {args.input}")
+        
+        # Create main output directory
+        os.makedirs(args.output, exist_ok=True)
+        
+        # Find all gene_stats_*.txt files, in deterministic order
+        gene_stats_files = sorted(glob.iglob(
+            os.path.join(args.input, '**', 'gene_stats_*.txt'), recursive=True))
+        
+        if not gene_stats_files:
+            print(f"Error: No gene_stats_*.txt files found in {args.input}")
+            sys.exit(1)
+        
+        print(f"Found {len(gene_stats_files)} sample files to process")
+        
+        # Warm the shared GFF cache in the parent so forked workers
+        # inherit the parsed genome instead of re-parsing it per sample
+        if os.path.isfile(args.genome):
+            mtime = os.path.getmtime(args.genome)
+            _load_chromosome_lengths(args.genome, mtime)
+            _load_gff_genes(args.genome, mtime)
+
+        # Process each file; independent samples run in parallel workers
+        jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+        success_count = 0
+        if jobs > 1 and len(gene_stats_files) > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=jobs, initializer=_init_batch_worker) as executor:
+                futures = [executor.submit(_process_one, stats_file, args, visual)
+                           for stats_file in gene_stats_files]
+                results = [future.result()
+                           for future in concurrent.futures.as_completed(futures)]
+        else:
+            results = [_process_one(stats_file, args, visual)
+                       for stats_file in gene_stats_files]
+
+        for sample_name, success, error in results:
+            if success:
+                success_count += 1
+                print(f"  ? Completed: {sample_name}")
+            elif error is not None:
+                print(f"  ? Error processing {sample_name}: {error}")
+            else:
+                print(f"  ? Failed: {sample_name}")
+        
+        # Generate batch summary
+        print(f"\n{'='*60}")
+        print("Batch Processing Summary")
+        print(f"{'='*60}")
+        print(f"Total files found: {len(gene_stats_files)}")
+        print(f"Successfully processed: {success_count}")
+        print(f"Failed: {len(gene_stats_files) - success_count}")
+        print(f"Output directory: {args.output}")
+        print(f"{'='*60}")
+        
+        # Create summary file
+        with open(os.path.join(args.output, 'batch_processing_summary.txt'), 'w') as f:
+            f.write("Batch Processing Summary\n")
+            f.write("="*80 + "\n")
+            f.write(f"Input directory: {args.input}\n")
+            f.write(f"Total files found: {len(gene_stats_files)}\n")
+            f.write(f"Successfully processed: {success_count}\n")
+            f.write(f"Failed: {len(gene_stats_files) - success_count}\n")
+            f.write(f"Genome file: {args.genome}\n")
+            f.write(f"High threshold: {args.High}\n")
+            f.write(f"Medium threshold: {args.Medium}\n")
+            f.write(f"Min threshold: {args.Min}\n")
+            f.write(f"Visualization: {'Enabled' if visual else 'Disabled'}\n\n")
+            
+            f.write("Individual sample outputs:\n")
+            for sample_dir in sorted(os.listdir(args.output)):
+                sample_path = os.path.join(args.output, sample_dir)
+                if os.path.isdir(sample_path):
+                    f.write(f"  - {sample_dir}: {sample_path}\n")
+        
+        return
+    
+    # Single file processing (original logic)
+    # Validate inputs
+    if not os.path.exists(args.input):
+        print(f"Error: Input path does not exist: {args.input}")
+        sys.exit(1)
+    
+    if not os.path.isfile(args.genome):
+        print(f"Error: Genome file does not exist: {args.genome}")
+        sys.exit(1)
+    
+    # Create output directory
+    os.makedirs(args.output, exist_ok=True)
+    
+    print("POAtools - Step 4: Exact R Replication Gene Classification Analysis")
+    print("=" * 60)
+    print(f"Input file: {args.input}")
+    print(f"Genome file: {args.genome}")
+    print(f"High confidence threshold: {args.High}")
+    print(f"Medium confidence threshold: {args.Medium}")
+    print(f"Minimum confidence threshold: {args.Min}")
+    print(f"Visualization: {'Enabled' if visual else 'Disabled'}")
+    print(f"Output directory: {args.output}")
+    print("=" * 60)
+    
+    # Initialize analyzer
+    analyzer = ExactRReplication(
+        high_threshold=args.High,
+        medium_threshold=args.Medium,
+        min_threshold=args.Min,
+        visual=visual,
+        output_format=args.fmt,
+        min_plot_rows=args.min_plot_rows
+    )
+    
+    # Extract sample name from filename
+    sample_name = _sample_name_from(args.input)
+    
+    # Run analysis
+    try:
+        success = analyzer.run_analysis(args.input, args.genome, args.output, sample_name)
+        if success:
+            print("=" * 60)
+            print("Step 4 completed successfully!")
+            print(f"Results saved to: {args.output}")
+        else:
+            print("Step 4 failed!")
+            sys.exit(1)
+    except Exception as e:
+        print(f"Error during analysis: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
     main()
\ No newline at end of file